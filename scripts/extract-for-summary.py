@@ -6,6 +6,10 @@ import json
 import os
 import re
 import sys
+import tempfile
+
+EXTRACT_CACHE_FILE = os.path.expanduser("~/.claude/skills/history/cache/extracts.json")
+EXTRACT_CACHE_MAX_ENTRIES = 200
 
 
 def find_session_file(session_id):
@@ -51,13 +55,8 @@ def extract_tools(content):
     return tools
 
 
-def extract_session(session_id):
-    """セッションから要約用の要点を抽出して出力。"""
-    filepath = find_session_file(session_id)
-
-    if not os.path.exists(filepath):
-        return f"セッションが見つかりません: {session_id}"
-
+def load_messages(filepath):
+    """セッションファイルから (role, text) のメッセージ列を読み込む。"""
     messages = []  # [(role, text)]
 
     with open(filepath, "r", encoding="utf-8") as f:
@@ -93,91 +92,144 @@ def extract_session(session_id):
 
             messages.append((row_type, text))
 
-    if not messages:
-        return "メッセージなし"
+    return messages
 
-    # 先頭5件 + 末尾5件を抽出（重複排除）
-    head = 5
-    tail = 5
-    total = len(messages)
 
+def truncate(text, limit):
+    """メッセージを limit 文字に制限。"""
+    if len(text) > limit:
+        return text[:limit - 3] + "..."
+    return text
+
+
+def build_extract(messages, head, tail, limit):
+    """先頭 head 件 + 末尾 tail 件を切り詰めて抽出（重複排除）。"""
+    total = len(messages)
     if total <= head + tail:
-        selected = messages
+        head_msgs, tail_msgs = messages, []
     else:
-        selected = messages[:head] + [("...", f"（中略: {total - head - tail}メッセージ）")] + messages[-tail:]
+        head_msgs, tail_msgs = messages[:head], messages[-tail:]
+    return {
+        "head": [[role, truncate(text, limit)] for role, text in head_msgs],
+        "tail": [[role, truncate(text, limit)] for role, text in tail_msgs],
+        "skipped": max(total - head - tail, 0),
+    }
+
+
+def session_fingerprint(filepath):
+    """セッションファイルの更新を検出するためのフィンガープリント。"""
+    st = os.stat(filepath)
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def load_extract_cache():
+    """キャッシュされた抽出結果を読み込む。"""
+    if os.path.exists(EXTRACT_CACHE_FILE):
+        try:
+            with open(EXTRACT_CACHE_FILE, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if isinstance(cache, dict):
+                return cache
+        except (json.JSONDecodeError, OSError):
+            pass
+    return {}
+
+
+def save_extract_cache(cache, snapshot):
+    """抽出結果のキャッシュを保存（古いものから上限件数まで削除）。
+
+    読み込み時の内容 snapshot から変化がなければ書き込まない。
+    """
+    while len(cache) > EXTRACT_CACHE_MAX_ENTRIES:
+        del cache[next(iter(cache))]
+    data = json.dumps(cache, ensure_ascii=False)
+    if data == snapshot:
+        return
+    cache_dir = os.path.dirname(EXTRACT_CACHE_FILE)
+    tmp = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # 同時実行でも衝突しないよう実行ごとに一時ファイルを分ける
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=cache_dir, suffix=".tmp", delete=False
+        ) as f:
+            tmp = f.name
+            f.write(data)
+        os.replace(tmp, EXTRACT_CACHE_FILE)
+    except OSError as e:
+        print(f"抽出キャッシュを保存できません: {e}", file=sys.stderr)
+        if tmp and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def is_valid_entry(entry, fingerprint):
+    """キャッシュエントリが現在のセッションに対して使える形かを判定。"""
+    if not isinstance(entry, dict) or entry.get("fingerprint") != fingerprint:
+        return False
+    for part in ("head", "tail"):
+        messages = entry.get(part)
+        if not isinstance(messages, list):
+            return False
+        for msg in messages:
+            if not (isinstance(msg, list) and len(msg) == 2 and all(isinstance(x, str) for x in msg)):
+                return False
+    skipped = entry.get("skipped")
+    return isinstance(skipped, int) and not isinstance(skipped, bool)
+
+
+def get_extract(session_id, mode, head, tail, limit, cache):
+    """キャッシュを使って抽出結果を取得。変更されたセッションのみ再抽出する。"""
+    filepath = find_session_file(session_id)
+
+    if not os.path.exists(filepath):
+        return None
+
+    # 抽出設定もキーに含め、設定変更時は自動的に再抽出する
+    key = f"{mode}:{head}:{tail}:{limit}:{session_id}"
+    fingerprint = session_fingerprint(filepath)
+    entry = cache.pop(key, None)
+    if not is_valid_entry(entry, fingerprint):
+        entry = build_extract(load_messages(filepath), head, tail, limit)
+        entry["fingerprint"] = fingerprint
+    # 末尾に置き直して最近使ったものとして扱う（LRU）
+    cache[key] = entry
+    return entry
+
+
+def format_extract(entry):
+    """抽出結果を [U]/[A] 形式のテキストにする。"""
+    selected = list(entry["head"])
+    if entry["skipped"]:
+        selected.append(["...", f"（中略: {entry['skipped']}メッセージ）"])
+    selected.extend(entry["tail"])
+
+    if not selected:
+        return "メッセージなし"
 
     lines = []
     for role, text in selected:
-        # 各メッセージを150文字に制限
-        if len(text) > 150:
-            text = text[:147] + "..."
         label = "U" if role == "user" else ("A" if role == "assistant" else "...")
         lines.append(f"[{label}] {text}")
 
     return "\n".join(lines)
 
 
-def extract_session_detail(session_id):
-    """セッションからresume時に貼り付ける用の詳細な文脈を抽出。"""
-    filepath = find_session_file(session_id)
-
-    if not os.path.exists(filepath):
+def extract_session(session_id, cache):
+    """セッションから要約用の要点を抽出して出力。"""
+    # 先頭5件 + 末尾5件、各メッセージを150文字に制限
+    entry = get_extract(session_id, "short", 5, 5, 150, cache)
+    if entry is None:
         return f"セッションが見つかりません: {session_id}"
+    return format_extract(entry)
 
-    messages = []
-
-    with open(filepath, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                row = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-
-            row_type = row.get("type")
-            if row_type not in ("user", "assistant"):
-                continue
-
-            content = row.get("message", {}).get("content", "")
-            text = extract_text(content)
-            tools = extract_tools(content) if row_type == "assistant" else []
-
-            if tools and not text:
-                text = f"[ツール使用: {', '.join(tools)}]"
-            elif tools and text:
-                text = f"{text} [ツール: {', '.join(tools)}]"
-
-            skip_patterns = [
-                "No response requested", "Caveat:", "Launching skill:",
-            ]
-            if not text or len(text) < 2 or any(p in text for p in skip_patterns):
-                continue
-
-            messages.append((row_type, text))
-
-    if not messages:
-        return "メッセージなし"
-
-    # 詳細版: 先頭10件 + 末尾15件（文脈引き継ぎ用）
-    head = 10
-    tail = 15
-    total = len(messages)
-
-    if total <= head + tail:
-        selected = messages
-    else:
-        selected = messages[:head] + [("...", f"（中略: {total - head - tail}メッセージ）")] + messages[-tail:]
 
-    lines = []
-    for role, text in selected:
-        if len(text) > 300:
-            text = text[:297] + "..."
-        label = "U" if role == "user" else ("A" if role == "assistant" else "...")
-        lines.append(f"[{label}] {text}")
-
-    return "\n".join(lines)
+def extract_session_detail(session_id, cache):
+    """セッションからresume時に貼り付ける用の詳細な文脈を抽出。"""
+    # 詳細版: 先頭10件 + 末尾15件（文脈引き継ぎ用）、各メッセージを300文字に制限
+    entry = get_extract(session_id, "detail", 10, 15, 300, cache)
+    if entry is None:
+        return f"セッションが見つかりません: {session_id}"
+    return format_extract(entry)
 
 
 def main():
@@ -191,14 +243,17 @@ def main():
         detail_mode = True
         args = args[1:]
 
+    cache = load_extract_cache()
+    snapshot = json.dumps(cache, ensure_ascii=False)
     session_ids = args
     for sid in session_ids:
         print(f"=== SESSION {sid} ===")
         if detail_mode:
-            print(extract_session_detail(sid))
+            print(extract_session_detail(sid, cache))
         else:
-            print(extract_session(sid))
+            print(extract_session(sid, cache))
         print()
+    save_extract_cache(cache, snapshot)
 
 
 if __name__ == "__main__":